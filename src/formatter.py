@@ -1,20 +1,122 @@
 
+import codecs
 import csv
 import json
+import os
+import re
 from abc import ABCMeta, abstractmethod
-from io import TextIOWrapper
+from enum import Enum
+from functools import lru_cache
+from io import BufferedIOBase, BytesIO, RawIOBase, StringIO, TextIOWrapper
+from itertools import chain
+from operator import itemgetter
 from pathlib import Path
-from typing import IO, Any, Dict, List, Tuple, Union
+from types import MappingProxyType
+from typing import IO, Any, Callable, ClassVar, Dict, FrozenSet, Iterator, List, Literal, Mapping, Sequence, Tuple, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from ujson import loads as _ujson_loads
+except ImportError:
+    _ujson_loads = None
 
 from ruamel.yaml import YAML
 
+try:
+    import yaml
+    from yaml import CSafeDumper, CSafeLoader
+except ImportError:
+    yaml = None
+
+_BUFFER_SIZE = 1 << 20
+_LONG_DIGITS = re.compile(r'[0-9]{19,}')
+_LONG_DIGITS_BYTES = re.compile(rb'[0-9]{19,}')
+
+
+def _require_libyaml() -> None:
+    if yaml is None:
+        raise ImportError('libyaml=True requires PyYAML built with libyaml')
+
+
+class _BatchedWriter():
+    # collects small emitter writes and passes them to fp in large chunks;
+    # going through fp itself keeps its encoding and newline handling
+    def __init__(self, fp: IO, size: int = _BUFFER_SIZE) -> None:
+        if hasattr(fp, 'encoding'):
+            # emitters (ruamel) decide between str and bytes output by this attribute
+            self.encoding = fp.encoding
+        self._fp = fp
+        self._size = size
+        self._chunks: List[Any] = []
+        self._pending = 0
+
+    def write(self, data: Any) -> int:
+        self._chunks.append(data)
+        self._pending += len(data)
+        if self._pending >= self._size:
+            self.flush()
+        return len(data)
+
+    def flush(self) -> None:
+        if self._chunks:
+            chunks, self._chunks, self._pending = self._chunks, [], 0
+            self._fp.write(chunks[0][:0].join(chunks))
+
+
+def _plain_float(val: float) -> bool:
+    # the range in which repr() (and so the stdlib encoder) does not switch to
+    # exponent notation; orjson writes the same digits there. Excludes NaN/inf.
+    return val == 0.0 or 1e-4 <= abs(val) < 1e16
+
+
+def _plain_key(key: Any, sort_keys: bool) -> bool:
+    if type(key) is str:
+        return True
+    # non-str keys are sorted after conversion by orjson but before it by the stdlib
+    if sort_keys:
+        return False
+    return key is None or type(key) in (int, bool) or (type(key) is float and _plain_float(key))
+
+
+def _orjson_compatible(data: Any, default: Any, sort_keys: bool) -> bool:
+    # orjson and the stdlib encoder write the same text only for plain data: they differ
+    # on NaN/Infinity, exponent-notation floats, Enum members and tuple subclasses
+    stack = [data]
+    visited = set()
+    while stack:
+        val = stack.pop()
+        if isinstance(val, Enum):
+            return False
+        elif val is None or isinstance(val, (str, int)):
+            continue
+        elif type(val) is float:
+            if not _plain_float(val):
+                return False
+        elif isinstance(val, (dict, list)) or type(val) is tuple:
+            if id(val) in visited:
+                # shared or circular; leave it to the stdlib
+                return False
+            visited.add(id(val))
+            if isinstance(val, dict):
+                if not all(_plain_key(key, sort_keys) for key in val):
+                    return False
+                stack.extend(val.values())
+            else:
+                stack.extend(val)
+        elif isinstance(val, (float, tuple)) or default is not str:
+            # whatever `default` returns is encoded without being checked here
+            return False
+    return True
 
-class BaseFormatter(metaclass=ABCMeta):
 
-    @property
-    @abstractmethod
-    def extensions(self) -> Tuple[str, ...]:
-        pass
+class BaseFormatter(metaclass=ABCMeta):
+    __slots__ = ()
+    extensions: ClassVar[Tuple[str, ...]] = ()
+    binary: ClassVar[bool] = False
 
     @abstractmethod
     def load(self, fp: IO) -> Any:
@@ -26,76 +128,185 @@ class BaseFormatter(metaclass=ABCMeta):
 
 
 class CsvFormatter(BaseFormatter):
-    @property
-    def extensions(self) -> Tuple[str, ...]:
-        return ('.csv',)
-
-    def load(self, fp: IO, *, delimiter: str = ',') -> Any:
-        reader = csv.DictReader(fp, delimiter=delimiter)
-        return reader
+    __slots__ = ()
+    extensions = ('.csv',)
+
+    def load(self, fp: IO, *, delimiter: str = ',', engine: Literal['dictreader', 'pandas', 'arrow'] = 'dictreader') -> Any:
+        if engine == 'dictreader':
+            return csv.DictReader(fp, delimiter=delimiter)
+        elif engine == 'pandas':
+            import pandas as pd
+            try:
+                frame = pd.read_csv(fp, sep=delimiter, dtype=str, keep_default_na=False)
+            except pd.errors.EmptyDataError:
+                return []
+            return frame.to_dict(orient='records')
+        elif engine == 'arrow':
+            return self._load_arrow(fp, delimiter)
+        raise ValueError('unknown csv engine: %s' % engine)
+
+    def _load_arrow(self, fp: IO, delimiter: str) -> List[Dict[str, str]]:
+        import pyarrow as pa
+        import pyarrow.csv as pv
+
+        # the header is read first so every column can be kept as text like DictReader
+        # does, instead of letting arrow infer types
+        if isinstance(fp, TextIOWrapper):
+            if not fp.seekable():
+                raise ValueError("csv engine 'arrow' needs a seekable file, use 'dictreader' for pipes and stdin")
+            start = fp.tell()
+            header = next(csv.reader(fp, delimiter=delimiter), [])
+            fp.seek(start)
+            encoding, source = fp.encoding, fp.buffer
+        else:
+            # other text streams (io.StringIO, ...) have no byte buffer for arrow to read
+            text = fp.read()
+            header = next(csv.reader(StringIO(text), delimiter=delimiter), [])
+            encoding, source = 'utf-8', BytesIO(text.encode('utf-8'))
+        if not header:
+            return []
+
+        table = pv.read_csv(
+            source,
+            read_options=pv.ReadOptions(encoding=encoding),
+            parse_options=pv.ParseOptions(delimiter=delimiter),
+            convert_options=pv.ConvertOptions(column_types={name: pa.string() for name in header}),
+        )
+        return table.to_pylist()
 
     def dump(self, rows: Any, fp: IO, *,
              sort_keys: bool = False, listup: bool = False,
              delimiter: str = ',', lineterminator: str = '\n', quoting: Any = csv.QUOTE_ALL, extrasaction: str = 'ignore') -> Any:
         if not rows:
             return
-        if hasattr(rows, 'keys') or hasattr(rows, 'join'):
+        if isinstance(rows, (dict, str)):
             rows = [rows]
 
         itr = iter(rows)
-        scanned = [next(itr)]
-        fields = list(scanned[0].keys())
-        seen = set(fields)
+        first_row = next(itr, None)
+        if first_row is None:
+            return
+        fields = list(first_row.keys())
 
         if listup:
+            # every row has to be seen before the header can be written
+            buffered = [first_row]
+            seen = set(fields)
             for row in itr:
                 for k in row.keys():
                     if k not in seen:
                         seen.add(k)
                         fields.append(k)
-                scanned.append(row)
+                buffered.append(row)
+            itr = buffered
+        else:
+            itr = chain([first_row], itr)
+
         if sort_keys:
-            fields = sorted(fields)
-        fields = list(fields)
-        writer = csv.DictWriter(fp, fields, delimiter=delimiter, lineterminator=lineterminator, quoting=quoting, extrasaction=extrasaction)
-        writer.writeheader()
-        writer.writerows(scanned)
-        writer.writerows(itr)
+            fields.sort()
+        writer = csv.writer(fp, delimiter=delimiter, lineterminator=lineterminator, quoting=quoting)
+        writer.writerow(fields)
+        writer.writerows(map(self._row_getter(fields, extrasaction), itr))
+
+    def _row_getter(self, fields: Sequence[str], extrasaction: str) -> Callable[[Any], Tuple[Any, ...]]:
+        # same row layout as csv.DictWriter (missing -> '', extras ignored or rejected)
+        extrasaction = extrasaction.lower()
+        if extrasaction not in ('raise', 'ignore'):
+            raise ValueError("extrasaction (%s) must be 'raise' or 'ignore'" % extrasaction)
+
+        if len(fields) == 1:
+            key = fields[0]
+            getter = lambda row: (row[key],)
+        else:
+            getter = itemgetter(*fields) if fields else lambda row: ()
+        fields = tuple(fields)
+        field_set = frozenset(fields)
+
+        def _row(row: Any) -> Tuple[Any, ...]:
+            if extrasaction == 'raise' and not field_set.issuperset(row.keys()):
+                extras = [k for k in row.keys() if k not in field_set]
+                raise ValueError('dict contains fields not in fieldnames: ' + ', '.join(map(repr, extras)))
+            # only plain dicts take the itemgetter path: a mapping with __missing__
+            # (defaultdict, ...) would fill in and store its default instead of ''
+            if type(row) is dict:
+                try:
+                    return getter(row)
+                except KeyError:
+                    pass
+            return tuple(row.get(k, '') for k in fields)
+        return _row
 
 
 class JsonFomatter(BaseFormatter):
-    @property
-    def extensions(self) -> Tuple[str, ...]:
-        return ('.json', '.js')
+    __slots__ = ()
+    extensions = ('.json', '.js')
+    binary = True
 
     def load(self, fp: IO) -> Any:
-        return json.load(fp)
+        raw = fp.read()
+        fast_loads = orjson.loads if orjson is not None else _ujson_loads
+        # the fast parsers are limited to 64-bit integers and turn wider ones into floats
+        long_digits = _LONG_DIGITS_BYTES if isinstance(raw, bytes) else _LONG_DIGITS
+        if fast_loads is not None and not long_digits.search(raw):
+            try:
+                return fast_loads(raw)
+            except ValueError:
+                # NaN, Infinity, 1e400, lone surrogates, ... are accepted by the stdlib
+                pass
+        return json.loads(raw)
 
     def dump(self, data: Any, fp: IO, *, ensure_ascii: bool = False, sort_keys: bool = False, indent: int = 2, default: Any = str) -> Any:
-        return json.dump(data, fp, ensure_ascii=ensure_ascii, indent=indent, default=default, sort_keys=sort_keys,)
+        binary = isinstance(fp, (RawIOBase, BufferedIOBase))
+        # orjson only knows 2-space indentation and always emits UTF-8; datetimes and
+        # dataclasses are passed through to `default` to match the stdlib output
+        if orjson is not None and not ensure_ascii and indent == 2 and _orjson_compatible(data, default, sort_keys):
+            option = orjson.OPT_NON_STR_KEYS | orjson.OPT_INDENT_2 | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+            if sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            try:
+                out = orjson.dumps(data, default=default, option=option)
+            except orjson.JSONEncodeError:
+                # e.g. integers wider than 64 bits
+                pass
+            else:
+                return fp.write(out if binary else out.decode('utf-8'))
+        text = json.dumps(data, ensure_ascii=ensure_ascii, indent=indent, default=default, sort_keys=sort_keys,)
+        return fp.write(text.encode('utf-8') if binary else text)
 
 
 class YamlFomatter(BaseFormatter):
+    __slots__ = ('yaml',)
+    extensions = ('.yaml', '.yml')
+    binary = True
+
+    # ruamel (YAML 1.2) is the default. libyaml=True switches to PyYAML's C loader/dumper,
+    # which is faster but follows YAML 1.1: `yes`/`NO` become booleans, `010` is octal.
     def __init__(self) -> None:
         self.yaml = YAML(typ='safe')
         super().__init__()
 
-    @property
-    def extensions(self) -> Tuple[str, ...]:
-        return ('.yaml', '.yml')
-
-    def load(self, fp: IO) -> Any:
+    def load(self, fp: IO, *, libyaml: bool = False) -> Any:
+        if libyaml:
+            _require_libyaml()
+            return yaml.load(fp, Loader=CSafeLoader)
         return self.yaml.load(fp)
 
-    def dump(self, data: Any, fp: IO, *, flow_style: bool = False) -> Any:
-        self.yaml.default_flow_style = flow_style
-        return self.yaml.dump(data, fp)
+    def dump(self, data: Any, fp: IO, *, flow_style: bool = False, libyaml: bool = False) -> Any:
+        out = _BatchedWriter(fp)
+        try:
+            if libyaml:
+                _require_libyaml()
+                encoding = 'utf-8' if isinstance(fp, (RawIOBase, BufferedIOBase)) else None
+                return yaml.dump(data, out, Dumper=CSafeDumper, default_flow_style=flow_style, allow_unicode=True, encoding=encoding)
+            self.yaml.default_flow_style = flow_style
+            return self.yaml.dump(data, out)
+        finally:
+            out.flush()
 
 
 class RawTextFomatter(BaseFormatter):
-    @property
-    def extensions(self) -> Tuple[str, ...]:
-        return ('.txt',)
+    __slots__ = ()
+    extensions = ('.txt',)
 
     def load(self, fp: IO) -> Any:
         return fp.read()
@@ -104,27 +315,41 @@ class RawTextFomatter(BaseFormatter):
         return fp.write(data)
 
 
+_DEFAULT_FORMATTERS: Dict[str, BaseFormatter] = {
+    'yaml': YamlFomatter(),
+    'json': JsonFomatter(),
+    'csv': CsvFormatter(),
+    'raw': RawTextFomatter()
+}
+
+
 class Dispatcher():
     def __init__(self) -> None:
-        self._formatters: Dict[str, BaseFormatter] = {
-            'yaml': YamlFomatter(),
-            'json': JsonFomatter(),
-            'csv': CsvFormatter(),
-            'raw': RawTextFomatter()
-        }
-        self.formatter_map: Dict[str, str] = {}
-        self.extensions: List[str] = []
-        for key, fmtr in self._formatters.items():
-            for ext in fmtr.extensions:
-                self.extensions.append(ext)
-                self.formatter_map[ext] = key
+        # formatters are stateless enough to be shared by every Dispatcher
+        self._formatters: Dict[str, BaseFormatter] = _DEFAULT_FORMATTERS
+        extensions, formatter_map, ext_to_formatter = self._extension_table()
+        # immutable so it cannot drift from the set has_extension looks up
+        self.extensions: Tuple[str, ...] = extensions
+        self.formatter_map: Mapping[str, str] = formatter_map
+        self._extensions_set: FrozenSet[str] = frozenset(extensions)
+        self._ext_to_formatter: Mapping[str, BaseFormatter] = ext_to_formatter
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def _extension_table(cls) -> Tuple[Tuple[str, ...], Mapping[str, str], Mapping[str, BaseFormatter]]:
+        formatter_map: Dict[str, str] = {}
+        for key, fmtr in _DEFAULT_FORMATTERS.items():
+            for ext in type(fmtr).extensions:
+                formatter_map[ext] = key
+        ext_to_formatter = {ext: _DEFAULT_FORMATTERS[name] for ext, name in formatter_map.items()}
+        return tuple(formatter_map), MappingProxyType(formatter_map), MappingProxyType(ext_to_formatter)
 
     @property
     def extensions_list(self) -> List[str]:
-        return self.extensions
+        return list(self.extensions)
 
     def has_extension(self, ext: str) -> bool:
-        return ext in self.extensions
+        return ext in self._extensions_set
 
     def get_format_type(self, ext: str) -> Union[str, None]:
         return self.formatter_map.get(ext, None)
@@ -133,10 +358,9 @@ class Dispatcher():
         return self._formatters[name]
 
     def get_formatter_from_exts(self, ext: str) -> BaseFormatter:
-        name = self.formatter_map.get(ext, 'raw')
-        return self.get_formatter(name)
+        return self._ext_to_formatter.get(ext, self._formatters['raw'])
 
-    def loadfile(self, fp: Union[IO, Path, str], *, format: Union[str, None] = None, encoding: str = 'utf-8') -> Any:
+    def loadfile(self, fp: Union[IO, Path, str], *, format: Union[str, None] = None, encoding: str = 'utf-8', jsoncache: bool = False, **options: Any) -> Any:
         if format is None:
             if isinstance(fp, str):
                 format = self.get_format_type(self._suffix(fp)) or 'raw'
@@ -148,17 +372,51 @@ class Dispatcher():
                 format = 'raw'
 
         formatter = self.get_formatter(format)
-        if isinstance(fp, str):
-            with open(fp, mode='r', encoding=encoding) as f:
-                fp = f
-        elif isinstance(fp, Path):
-            with fp.open('r', encoding=encoding) as f:
-                fp = f
-        return formatter.load(fp)
+        if isinstance(fp, (str, Path)):
+            path = Path(fp)
+            if format == 'yaml' and jsoncache:
+                return self._load_yaml_cached(formatter, path, encoding, options)
+            with self._open(path, formatter, encoding) as f:
+                data = formatter.load(f, **options)
+                # lazy readers (csv.DictReader) must be drained before the file is closed
+                return list(data) if isinstance(data, Iterator) else data
+        return formatter.load(fp, **options)
+
+    def _open(self, path: Path, formatter: BaseFormatter, encoding: str) -> IO:
+        # binary loaders decode UTF-8 themselves; any other encoding needs a text stream
+        if formatter.binary and codecs.lookup(encoding).name == 'utf-8':
+            return path.open('rb', buffering=_BUFFER_SIZE)
+        return path.open('r', encoding=encoding, buffering=_BUFFER_SIZE)
+
+    def _load_yaml_cached(self, formatter: BaseFormatter, path: Path, encoding: str, options: Dict[str, Any]) -> Any:
+        cache = path.with_name(path.name + '.jsoncache')
+        # the cache is only valid for the exact source and loader it was built from;
+        # comparing timestamps would trust it after an older file is restored with `cp -p`
+        stat = path.stat()
+        source = {
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'encoding': codecs.lookup(encoding).name,
+            'loader': 'libyaml' if options.get('libyaml') else 'ruamel',
+        }
+        try:
+            with cache.open('rb', buffering=_BUFFER_SIZE) as f:
+                cached = json.load(f)
+            if cached['source'] == source:
+                return cached['data']
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+        with self._open(path, formatter, encoding) as f:
+            data = formatter.load(f, **options)
+        try:
+            text = json.dumps({'source': source, 'data': data}, ensure_ascii=False)
+            # skip caching when JSON cannot round-trip the data (dates, non-str keys, ...)
+            if json.loads(text)['data'] == data:
+                cache.write_text(text, encoding='utf-8')
+        except (OSError, TypeError, ValueError):
+            pass
+        return data
 
     def _suffix(self, path: str) -> str:
-        i = path.rfind('.')
-        if 0 < i < len(path) - 1:
-            return path[i:]
-        else:
-            return ''
+        return os.path.splitext(path)[1]
@@ -5,57 +5,110 @@
 # https://github.com/podhmo/dictknife/blob/master/dictknife/deepmerge.py
 # 
 
-import copy
 from functools import partial
 from typing import Any, Dict, List, Tuple, Union
 
 
-def _extend(left, right, *, deduplicate=False):
+def _own(val):
+    # copy only what the accumulator may mutate later: dicts reachable through dicts
+    # and the lists that get appended to. Everything else is shared with the source.
+    if isinstance(val, dict):
+        copied = val.copy()
+        for key, item in copied.items():
+            copied[key] = _own(item)
+        return copied
+    elif isinstance(val, list):
+        return val[:]
+    else:
+        return val
+
+
+def _as_is(val):
+    return val
+
+
+def _extend_list(left, right, *, deduplicate=False):
+    if isinstance(left, tuple):
+        merged = list(left)
+    else:
+        merged = left
+    values = right if isinstance(right, (list, tuple)) else (right,)
+    if not deduplicate:
+        merged.extend(values)
+        return tuple(merged) if isinstance(left, tuple) else merged
+
+    # hashable items are checked against a set; only unhashable ones (dicts, lists)
+    # need an equality scan, and only against each other
+    seen = set()
+    unhashable = []
+    for val in merged:
+        try:
+            seen.add(val)
+        except TypeError:
+            unhashable.append(val)
+    for val in values:
+        try:
+            if val in seen:
+                continue
+            seen.add(val)
+        except TypeError:
+            if val in unhashable:
+                continue
+            unhashable.append(val)
+        merged.append(val)
+    return tuple(merged) if isinstance(left, tuple) else merged
+
+
+def _extend_value(left, right, *, deduplicate=False, own=_own):
     if isinstance(left, (list, tuple)):
-        merged = None
-        restore_tuple = False
-        if isinstance(left, tuple):
-            restore_tuple = True
-            merged = list(left[:])
-        else:
-            merged = left[:]
-        if isinstance(right, (list, tuple)):
-            for val in right:
-                if not (deduplicate and val in merged):
-                    merged.append(val)
-        else:
-            if not (deduplicate and right in merged):
-                merged.append(right)
-        return tuple(merged) if restore_tuple else merged
-    elif hasattr(left, 'get'):
-        if hasattr(right, 'get'):
-            merged = left.copy()
-            for key in right.keys():
-                if key in left:
-                    merged[key] = _extend(merged[key], right[key], deduplicate=deduplicate)
-                else:
-                    merged[key] = right[key]
-            return merged
-        elif right is None:
+        return _extend_list(left, right, deduplicate=deduplicate)
+    elif isinstance(left, dict):
+        if right is None:
             return left
-        else:
-            raise ValueError('cannot merge dict and non-dict: left=%s, right=%s', left, right)
+        raise ValueError('cannot merge dict and non-dict: left=%s, right=%s', left, right)
     else:
-        return right
+        return own(right)
 
 
-def _replace(left, right):
-    if hasattr(right, 'keys'):
-        for key, val in right.items():
-            if key in left:
-                left[key] = _replace(left[key], val)
+def _extend(left, right, *, deduplicate=False, last=False):
+    # left is the accumulator owned by mergedata and is updated in place
+    own = _as_is if last else _own
+    if not (isinstance(left, dict) and isinstance(right, dict)):
+        return _extend_value(left, right, deduplicate=deduplicate, own=own)
+
+    stack = [(left, right)]
+    pop, push = stack.pop, stack.append
+    while stack:
+        dst, src = pop()
+        for key, val in src.items():
+            if key not in dst:
+                dst[key] = own(val)
+                continue
+            cur = dst[key]
+            if isinstance(cur, dict) and isinstance(val, dict):
+                push((cur, val))
             else:
-                left[key] = copy.deepcopy(val)
-        return left
-    elif isinstance(right, (list, tuple)):
-        return right[:]
-    else:
-        return right
+                dst[key] = _extend_value(cur, val, deduplicate=deduplicate, own=own)
+    return left
+
+
+def _replace(left, right, *, last=False):
+    own = _as_is if last else _own
+    if not isinstance(right, dict):
+        return right[:] if isinstance(right, (list, tuple)) else right
+
+    stack = [(left, right)]
+    pop, push = stack.pop, stack.append
+    while stack:
+        dst, src = pop()
+        for key, val in src.items():
+            if key in dst and isinstance(val, dict):
+                push((dst[key], val))
+            elif key in dst:
+                dst[key] = val[:] if isinstance(val, (list, tuple)) else val
+            else:
+                dst[key] = own(val)
+    return left
 
 
 def mergedata(
@@ -71,10 +124,19 @@ def mergedata(
     if override:
         merge = _replace
 
-    left = data[0].__class__()
+    last_index = len(data) - 1
+    first = data[0]
+    if first and isinstance(first, dict):
+        # merging the first dict into an empty one is just taking a copy of it
+        left = first.copy() if last_index == 0 else _own(first)
+        start = 1
+    else:
+        left = first.__class__()
+        start = 0
 
-    for right in data:
+    for i in range(start, len(data)):
+        right = data[i]
         if not right:
             continue
-        left = merge(left, right)
+        left = merge(left, right, last=i == last_index)
     return left
@@ -0,0 +1,339 @@
+import collections
+import csv
+import datetime
+import enum
+import importlib
+import io
+import math
+import random
+import sys
+
+import pytest
+
+
+@pytest.fixture
+def formatter_without_pyyaml(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'yaml', None)
+    monkeypatch.delitem(sys.modules, 'formatter', raising=False)
+    module = importlib.import_module('formatter')
+    assert module.yaml is None
+    return module
+
+
+YAML_1_1_SAMPLE = 'a: yes\nb: 010\nc: NO\n'
+
+
+def test_yaml_load_is_yaml_1_2():
+    from formatter import YamlFomatter
+    assert YamlFomatter().load(io.StringIO(YAML_1_1_SAMPLE)) == {'a': 'yes', 'b': 10, 'c': 'NO'}
+
+
+def test_yaml_load_libyaml_is_yaml_1_1():
+    pytest.importorskip('yaml')
+    from formatter import YamlFomatter
+    assert YamlFomatter().load(io.StringIO(YAML_1_1_SAMPLE), libyaml=True) == {'a': True, 'b': 8, 'c': False}
+
+
+def test_yaml_dump_text_stream():
+    from formatter import YamlFomatter
+    fp = io.StringIO()
+    YamlFomatter().dump({'a': 1, 'b': ['x', 'y']}, fp)
+    assert fp.getvalue() == 'a: 1\nb:\n- x\n- y\n'
+
+
+def test_yaml_dump_binary_stream():
+    from formatter import YamlFomatter
+    fp = io.BytesIO()
+    YamlFomatter().dump({'a': 'caf\u00e9'}, fp)
+    assert fp.getvalue() == 'a: caf\u00e9\n'.encode('utf-8')
+
+
+def test_yaml_dump_libyaml_binary_stream():
+    pytest.importorskip('yaml')
+    from formatter import YamlFomatter
+    fp = io.BytesIO()
+    YamlFomatter().dump({'a': 'caf\u00e9'}, fp, libyaml=True)
+    assert fp.getvalue() == 'a: caf\u00e9\n'.encode('utf-8')
+
+
+def test_yaml_dump_libyaml_text_stream():
+    pytest.importorskip('yaml')
+    from formatter import YamlFomatter
+    fp = io.StringIO()
+    YamlFomatter().dump({'a': 'caf\u00e9'}, fp, libyaml=True)
+    assert fp.getvalue() == 'a: caf\u00e9\n'
+
+
+def test_yaml_dump_larger_than_batch():
+    pytest.importorskip('yaml')
+    from formatter import YamlFomatter, _BUFFER_SIZE
+    data = {'key%d' % i: 'value' for i in range(_BUFFER_SIZE // 10)}
+    fp = io.StringIO()
+    YamlFomatter().dump(data, fp, libyaml=True)
+    assert YamlFomatter().load(io.StringIO(fp.getvalue()), libyaml=True) == data
+
+
+def test_yaml_dump_ruamel_text_stream(formatter_without_pyyaml):
+    fp = io.StringIO()
+    formatter_without_pyyaml.YamlFomatter().dump({'a': 1}, fp)
+    assert fp.getvalue() == 'a: 1\n'
+
+
+def test_yaml_dump_ruamel_binary_stream(formatter_without_pyyaml):
+    fp = io.BytesIO()
+    formatter_without_pyyaml.YamlFomatter().dump({'a': 1}, fp)
+    assert fp.getvalue() == b'a: 1\n'
+
+
+def test_yaml_libyaml_requires_pyyaml(formatter_without_pyyaml):
+    with pytest.raises(ImportError):
+        formatter_without_pyyaml.YamlFomatter().load(io.StringIO('a: 1\n'), libyaml=True)
+
+
+def _cache_of(path):
+    return path.with_name(path.name + '.jsoncache')
+
+
+def test_loadfile_jsoncache_is_opt_in(tmp_path):
+    from formatter import Dispatcher
+    path = tmp_path / 'data.yaml'
+    path.write_text('v: 1\n')
+    assert Dispatcher().loadfile(path) == {'v': 1}
+    assert not _cache_of(path).exists()
+
+
+def test_loadfile_jsoncache_hit(tmp_path):
+    import json
+    from formatter import Dispatcher
+    path = tmp_path / 'data.yaml'
+    path.write_text('v: 1\n')
+    assert Dispatcher().loadfile(path, jsoncache=True) == {'v': 1}
+    cached = json.loads(_cache_of(path).read_text(encoding='utf-8'))
+    cached['data'] = {'v': 'from cache'}
+    _cache_of(path).write_text(json.dumps(cached), encoding='utf-8')
+    assert Dispatcher().loadfile(path, jsoncache=True) == {'v': 'from cache'}
+
+
+def test_loadfile_jsoncache_restored_older_file(tmp_path):
+    import os
+    import shutil
+    from formatter import Dispatcher
+    old = tmp_path / 'old.yaml'
+    old.write_text('v: old\n')
+    os.utime(old, ns=(1_000_000_000, 1_000_000_000))
+    path = tmp_path / 'data.yaml'
+    path.write_text('v: new\n')
+    assert Dispatcher().loadfile(path, jsoncache=True) == {'v': 'new'}
+    shutil.copy2(old, path)
+    assert Dispatcher().loadfile(path, jsoncache=True) == {'v': 'old'}
+
+
+def test_loadfile_jsoncache_same_mtime_different_size(tmp_path):
+    import os
+    from formatter import Dispatcher
+    path = tmp_path / 'data.yaml'
+    path.write_text('v: 1\n')
+    stat = path.stat()
+    assert Dispatcher().loadfile(path, jsoncache=True) == {'v': 1}
+    path.write_text('v: 1000\n')
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert Dispatcher().loadfile(path, jsoncache=True) == {'v': 1000}
+
+
+def test_loadfile_jsoncache_keyed_on_loader(tmp_path):
+    pytest.importorskip('yaml')
+    from formatter import Dispatcher
+    path = tmp_path / 'data.yaml'
+    path.write_text('a: yes\n')
+    assert Dispatcher().loadfile(path, jsoncache=True) == {'a': 'yes'}
+    assert Dispatcher().loadfile(path, jsoncache=True, libyaml=True) == {'a': True}
+    assert Dispatcher().loadfile(path, jsoncache=True) == {'a': 'yes'}
+
+
+def test_loadfile_jsoncache_keyed_on_encoding(tmp_path):
+    from formatter import Dispatcher
+    path = tmp_path / 'data.yaml'
+    path.write_bytes('v: caf\u00e9\n'.encode('utf-8'))
+    assert Dispatcher().loadfile(path, jsoncache=True) == {'v': 'caf\u00e9'}
+    assert Dispatcher().loadfile(path, jsoncache=True, encoding='latin-1') == {'v': 'caf\u00c3\u00a9'}
+
+
+JSON_LOAD_SAMPLES = [
+    '{"a": 1, "b": [true, null, "x"], "c": {"d": 1.5}}',
+    '{"a": 123456789012345678901234567890}',
+    '{"a": -9223372036854775809, "b": 18446744073709551615}',
+    '{"a": NaN, "b": Infinity, "c": -Infinity}',
+    '{"a": 1e400}',
+    '{"a": "\\ud800"}',
+]
+
+
+@pytest.mark.parametrize('doc', JSON_LOAD_SAMPLES)
+@pytest.mark.parametrize('stream', [io.StringIO, lambda doc: io.BytesIO(doc.encode('utf-8'))])
+def test_json_load_matches_stdlib(doc, stream):
+    import json
+    from formatter import JsonFomatter
+    # repr() so that NaN compares equal and int vs float is not glossed over
+    assert repr(JsonFomatter().load(stream(doc))) == repr(json.loads(doc))
+
+
+class _Color(enum.Enum):
+    R = 1
+
+
+JSON_DUMP_SAMPLES = [
+    {'a': [1, 2], 'b': {'c': None, 'd': 'café'}},
+    {'a': float('nan'), 'b': float('inf'), 'c': float('-inf')},
+    {'a': float('nan'), 'b': 2 ** 70},
+    {'a': 1e16, 'b': 1e-07, 'c': 1.5e300, 'd': 0.5, 'e': -0.0},
+    {'a': _Color.R},
+    {'a': datetime.datetime(2020, 1, 2, 3, 4, 5), 'b': datetime.date(2020, 1, 1)},
+    {2: 'two', 10: 'ten', 1.5: 'x'},
+]
+
+
+def _dump(data, **kwargs):
+    from formatter import JsonFomatter
+    fp = io.StringIO()
+    JsonFomatter().dump(data, fp, **kwargs)
+    return fp.getvalue()
+
+
+@pytest.mark.parametrize('data', JSON_DUMP_SAMPLES)
+@pytest.mark.parametrize('kwargs', [{}, {'sort_keys': True}, {'indent': None}])
+def test_json_dump_same_with_and_without_orjson(monkeypatch, data, kwargs):
+    import json
+    import formatter
+    with_orjson = _dump(data, **kwargs)
+    monkeypatch.setattr(formatter, 'orjson', None)
+    without_orjson = _dump(data, **kwargs)
+    expected = json.dumps(data, ensure_ascii=False, indent=kwargs.get('indent', 2), default=str, sort_keys=kwargs.get('sort_keys', False))
+    assert with_orjson == without_orjson == expected
+
+
+def test_json_dump_non_finite_round_trip():
+    from formatter import JsonFomatter
+    loaded = JsonFomatter().load(io.StringIO(_dump({'a': float('nan'), 'b': float('inf')})))
+    assert math.isnan(loaded['a']) and loaded['b'] == float('inf')
+
+
+def _dictwriter_dump(rows, *, sort_keys=False, listup=False, delimiter=',', lineterminator='\n', quoting=csv.QUOTE_ALL, extrasaction='ignore'):
+    # the csv.DictWriter based implementation CsvFormatter.dump replaced
+    rows = list(rows)
+    fields = list(rows[0].keys())
+    if listup:
+        for row in rows[1:]:
+            fields.extend(k for k in row.keys() if k not in fields)
+    if sort_keys:
+        fields = sorted(fields)
+    fp = io.StringIO()
+    writer = csv.DictWriter(fp, fields, delimiter=delimiter, lineterminator=lineterminator, quoting=quoting, extrasaction=extrasaction)
+    writer.writeheader()
+    writer.writerows(rows)
+    return fp.getvalue()
+
+
+def _csv_dump(rows, **kwargs):
+    from formatter import CsvFormatter
+    fp = io.StringIO()
+    CsvFormatter().dump(rows, fp, **kwargs)
+    return fp.getvalue()
+
+
+def test_csv_dump_matches_dictwriter():
+    rnd = random.Random(0)
+    values = ['', 'x', 'a,b', 'say "hi"', 'line\nbreak', 1, 2.5, None, True]
+    for _ in range(3000):
+        keys = rnd.sample('abcdef', rnd.randint(1, 4))
+        rows = [{k: rnd.choice(values) for k in rnd.sample(keys, rnd.randint(1, len(keys)))} for _ in range(rnd.randint(1, 5))]
+        kwargs = {
+            'listup': rnd.random() < 0.5,
+            'sort_keys': rnd.random() < 0.5,
+            'quoting': rnd.choice([csv.QUOTE_ALL, csv.QUOTE_MINIMAL, csv.QUOTE_NONNUMERIC]),
+            'delimiter': rnd.choice([',', ';']),
+        }
+        assert _csv_dump(iter(rows), **kwargs) == _dictwriter_dump(rows, **kwargs)
+
+
+def test_csv_dump_single_dict_row():
+    assert _csv_dump({'a': 1, 'b': 'x'}) == '"a","b"\n"1","x"\n'
+
+
+def test_csv_dump_defaultdict_row_writes_restval():
+    row = collections.defaultdict(lambda: 'DEFAULT', {'a': 1})
+    rows = [{'a': 0, 'b': 2}, row]
+    assert _csv_dump(rows) == _dictwriter_dump(rows) == '"a","b"\n"0","2"\n"1",""\n'
+    assert dict(row) == {'a': 1}
+
+
+def test_csv_dump_extrasaction_raise():
+    rows = [{'a': 1}, {'a': 2, 'b': 3}]
+    with pytest.raises(ValueError):
+        _dictwriter_dump(rows, extrasaction='raise')
+    with pytest.raises(ValueError):
+        _csv_dump(rows, extrasaction='raise')
+    assert _csv_dump(rows) == _dictwriter_dump(rows) == '"a"\n"1"\n"2"\n'
+
+
+def test_csv_dump_empty():
+    assert _csv_dump([]) == ''
+    assert _csv_dump(iter([])) == ''
+
+
+def test_dispatcher_extensions():
+    from formatter import Dispatcher
+    d = Dispatcher()
+    assert d.extensions == ('.yaml', '.yml', '.json', '.js', '.csv', '.txt')
+    assert all(d.has_extension(ext) for ext in d.extensions)
+    assert not d.has_extension('.toml')
+    extensions = d.extensions_list
+    extensions.append('.toml')
+    assert d.extensions_list == list(d.extensions)
+    assert not d.has_extension('.toml')
+
+
+CSV_LOAD_SAMPLES = [
+    'a,b,c\n1,x,\n2,"y, z","say ""hi"""\n',
+    'a,b\n1,"multi\nline"\n\n3,café\n',
+    'a,b\n01,1.50\n',
+    'a,b\n',
+    '',
+]
+
+
+@pytest.mark.parametrize('engine, module', [('pandas', 'pandas'), ('arrow', 'pyarrow')])
+@pytest.mark.parametrize('text', CSV_LOAD_SAMPLES)
+def test_csv_load_engine_matches_dictreader(engine, module, text):
+    pytest.importorskip(module)
+    from formatter import CsvFormatter
+    expected = list(CsvFormatter().load(io.StringIO(text)))
+    assert CsvFormatter().load(io.StringIO(text), engine=engine) == expected
+
+
+@pytest.mark.parametrize('engine, module', [('pandas', 'pandas'), ('arrow', 'pyarrow')])
+def test_loadfile_csv_engine(tmp_path, engine, module):
+    pytest.importorskip(module)
+    from formatter import Dispatcher
+    path = tmp_path / 'data.csv'
+    path.write_bytes('a;b\n1;café\n'.encode('cp1252'))
+    expected = Dispatcher().loadfile(path, encoding='cp1252', delimiter=';')
+    assert expected == [{'a': '1', 'b': 'café'}]
+    assert Dispatcher().loadfile(path, encoding='cp1252', delimiter=';', engine=engine) == expected
+
+
+def test_csv_load_arrow_needs_seekable_file():
+    pytest.importorskip('pyarrow')
+    import os
+    from formatter import CsvFormatter
+    read_fd, write_fd = os.pipe()
+    os.write(write_fd, b'a,b\n1,2\n')
+    os.close(write_fd)
+    with open(read_fd, 'r', encoding='utf-8') as fp:
+        with pytest.raises(ValueError):
+            CsvFormatter().load(fp, engine='arrow')
+
+
+def test_csv_load_unknown_engine():
+    from formatter import CsvFormatter
+    with pytest.raises(ValueError):
+        CsvFormatter().load(io.StringIO('a\n1\n'), engine='numpy')
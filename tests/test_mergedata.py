@@ -0,0 +1,109 @@
+import copy
+import random
+
+import pytest
+
+from mergedata import mergedata
+
+
+def test_empty():
+    assert mergedata() == {}
+
+
+def test_nested_dicts_and_list_extend():
+    left = {'a': {'x': 1, 'l': [1, 2]}, 'b': 1}
+    right = {'a': {'y': 2, 'l': [2, 3]}, 'c': 3}
+    assert mergedata(left, right) == {'a': {'x': 1, 'l': [1, 2, 3], 'y': 2}, 'b': 1, 'c': 3}
+
+
+@pytest.mark.parametrize('override', [False, True])
+def test_inputs_not_mutated(override):
+    data = [
+        {'a': {'x': [1, {'k': 1}], 'y': {'z': 1}}, 'b': (1, 2)},
+        {'a': {'x': [2, {'k': 1}], 'y': {'w': 2}}, 'b': [3]},
+        {'a': {'y': {'z': 3}}, 'c': {'d': [4]}},
+    ]
+    snapshot = copy.deepcopy(data)
+    merged = mergedata(*data, override=override)
+    assert data == snapshot
+    # the result must not alias values that an earlier source still owns
+    merged['a']['y']['new'] = 1
+    merged['a']['x'].append('new')
+    assert data == snapshot
+
+
+def test_override_replaces_lists_inside_dicts():
+    left = {'a': {'l': [1, 2], 'k': 1}, 'b': [1]}
+    right = {'a': {'l': [3]}, 'b': [2, 2]}
+    merged = mergedata(left, right, override=True)
+    assert merged == {'a': {'l': [3], 'k': 1}, 'b': [2, 2]}
+    merged['b'].append(9)
+    assert right == {'a': {'l': [3]}, 'b': [2, 2]}
+
+
+def test_override_new_keys_are_copied():
+    left = {'a': 1}
+    middle = {'b': {'c': [1]}}
+    merged = mergedata(left, middle, {'d': 1}, override=True)
+    merged['b']['c'].append(2)
+    merged['b']['x'] = 1
+    assert middle == {'b': {'c': [1]}}
+
+
+def test_tuple_lists():
+    assert mergedata((1, 2), (2, [3]), [[3]]) == (1, 2, [3])
+    assert mergedata({'a': (1,)}, {'a': [1, {'x': 1}]}, {'a': [{'x': 1}]}) == {'a': (1, {'x': 1})}
+
+
+def test_dedup_mixed_hashable_and_unhashable():
+    left = {'a': [1, 'x', {'k': 1}, [2]]}
+    right = {'a': [{'k': 1}, [2], 1, 'y', {'k': 2}, 'x', [2, 3]]}
+    assert mergedata(left, right) == {'a': [1, 'x', {'k': 1}, [2], 'y', {'k': 2}, [2, 3]]}
+
+
+def test_dedup_scalar_appended_to_list():
+    assert mergedata({'a': [1]}, {'a': 1}, {'a': 2}) == {'a': [1, 2]}
+
+
+def test_top_level_list_is_deduplicated():
+    assert mergedata([1, 1, 2]) == [1, 2]
+
+
+def test_single_source_is_copied():
+    data = {'a': {'b': 1}, 'c': [1]}
+    merged = mergedata(data)
+    assert merged == data
+    assert merged is not data
+    merged['x'] = 1
+    assert 'x' not in data
+
+
+def test_empty_sources_are_skipped():
+    assert mergedata({'a': 1}, {}, None, {'b': 2}) == {'a': 1, 'b': 2}
+
+
+def test_dict_with_non_dict_raises():
+    with pytest.raises(ValueError):
+        mergedata({'a': {'b': 1}}, {'a': 1})
+
+
+def _random_value(rnd, depth=0):
+    r = rnd.random()
+    if depth < 3 and r < 0.4:
+        return {rnd.choice('abcd'): _random_value(rnd, depth + 1) for _ in range(rnd.randint(0, 4))}
+    if depth < 3 and r < 0.6:
+        return [_random_value(rnd, depth + 2) for _ in range(rnd.randint(0, 4))]
+    return rnd.choice([1, 2, 'x', None, True])
+
+
+@pytest.mark.parametrize('override', [False, True])
+def test_random_inputs_not_mutated(override):
+    rnd = random.Random(0)
+    for _ in range(2000):
+        data = [{rnd.choice('abc'): _random_value(rnd, 1) for _ in range(3)} for _ in range(rnd.randint(1, 4))]
+        snapshot = copy.deepcopy(data)
+        try:
+            mergedata(*data, override=override)
+        except (ValueError, TypeError):
+            pass
+        assert data == snapshot